@@ -108,8 +108,8 @@ async def classify_and_update(flows):
         # Apply column mapping 
         df = df.rename(columns=config.column_mapping)
         
-        # Select only required features 
-        df = df[config.model_features]
+        # Align, add missing (as 0) and order features in one pass
+        df = df.reindex(columns=config.model_features, fill_value=0.0)
         
         # Data validation and cleaning
         logger.info(f"Starting classification for {len(flows)} flows")
@@ -2,8 +2,11 @@ import sys
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import threading
+import functools
 import uuid
 from datetime import datetime
 import socket
@@ -24,6 +27,18 @@ class NetworkFlowMonitor:
         self.running = False
         self.device_name = os.environ.get("COMPUTERNAME", socket.gethostname())
         self.local_ip = self.get_local_ip()
+
+        # Persistent keep-alive session shared by all server calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            # Default allowed_methods: POSTs are only retried on connection errors,
+            # never on 5xx, since a processed batch would be inserted twice
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         
         # Path handling for PyInstaller
         if getattr(sys, 'frozen', False):
@@ -37,16 +52,27 @@ class NetworkFlowMonitor:
         print(f"Server: {SERVER_URL}")
         print("=" * 40)
     
-    def get_local_ip(self):
-        """Get local IP address"""
+    @staticmethod
+    @functools.cache
+    def get_local_ip():
+        """Get local IP address (resolved once per process)"""
+        try:
+            # UDP connect only picks the outbound interface; nothing is sent
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(("8.8.8.8", 80))
+                return s.getsockname()[0]
+        except OSError:
+            pass
+        
+        # No route to 8.8.8.8: use the first non-loopback, non-link-local IPv4 address
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except:
-            return "Unknown"
+            for addrs in psutil.net_if_addrs().values():
+                for addr in addrs:
+                    if addr.family == socket.AF_INET and not addr.address.startswith(("127.", "169.254.")):
+                        return addr.address
+        except Exception:
+            pass
+        return "Unknown"
     
     def get_network_interfaces(self):
         """List available network interfaces"""
@@ -76,7 +102,7 @@ class NetworkFlowMonitor:
                 "status": "active"
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{SERVER_URL}/api/register-device",
                 json=device_info,
                 timeout=5
@@ -168,19 +194,32 @@ class NetworkFlowMonitor:
             print("Data sent directly to server")
             print("Press Ctrl+C to stop\n")
             
-            # Simple monitoring loop
-            last_send_time = time.time()
+            # Block on the child process instead of polling it: wake up when
+            # pcap2csv exits or the duration runs out. Windows can't interrupt
+            # an untimed wait with Ctrl+C, so waits are capped there.
+            deadline = time.time() + duration if duration else None
+            started = time.time()
             while self.running:
-                time.sleep(1)  # Just keep alive
+                timeout = None if deadline is None else max(0.0, deadline - time.time())
+                if sys.platform == "win32":
+                    timeout = 1.0 if timeout is None else min(timeout, 1.0)
                 
-                # Check if process is still running
-                if process.poll() is not None:
-                    print("PCAP2CSV process stopped. Restarting...")
-                    process = self.run_pcap2csv(interface=interface)
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    # Check duration limit
+                    if deadline is not None and time.time() >= deadline:
+                        print(f"\nCapture duration reached ({duration} seconds)")
+                        break
+                    continue
                 
-                # Check duration limit
-                if duration and time.time() - last_send_time > duration:
-                    print(f"\nCapture duration reached ({duration} seconds)")
+                print("PCAP2CSV process stopped. Restarting...")
+                # Throttle restarts when pcap2csv dies right away (bad interface, Npcap missing)
+                if time.time() - started < 1.0:
+                    time.sleep(1.0)
+                process = self.run_pcap2csv(interface=interface)
+                started = time.time()
+                if not process:
                     break
                     
         except KeyboardInterrupt:
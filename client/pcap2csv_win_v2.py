@@ -1,6 +1,6 @@
 # pcap2csv_win_v2.py [Convert PCAP/Live to CSV + capture HTTP URLs & TLS SNI]
 
-import argparse, csv, math, statistics, time, threading, signal, sys, os, re
+import argparse, csv, math, statistics, time, threading, signal, sys, os, re, queue
 from scapy.all import PcapReader, IP, IPv6, TCP, UDP, sniff, Raw
 from scapy.layers.http import HTTPRequest
 from scapy.layers.tls.handshake import TLSClientHello
@@ -10,7 +10,9 @@ from threading import Lock
 import re
 import socket
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import threading
 from datetime import datetime
 import uuid
@@ -22,6 +24,23 @@ BATCH_SIZE = 10  # Reduced batch size for more frequent sending
 batch_buffer = []
 batch_lock = threading.Lock()
 
+# Reuse one keep-alive connection pool for all uploads instead of reconnecting per batch
+session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Default allowed_methods: POSTs are only retried on connection errors,
+    # never on 5xx, since a processed batch would be inserted twice
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+# Uploads run on a sender thread so flow processing never blocks on the network;
+# the bound applies backpressure if the server falls behind
+send_queue = queue.Queue(maxsize=4)
+sender_thread = None
+
 # Add these after other global variables
 flows_lock = Lock()
 ip_to_hostname = {}
@@ -62,6 +81,8 @@ def reverse_dns_lookup(ip):
 
 flows = {}
 running = True
+stop_event = threading.Event()
+periodic_thread = None
 
 # ---------- helpers ----------
 def safe_mean(x): return statistics.fmean(x) if x else 0.0
@@ -145,9 +166,11 @@ def send_batch_to_server(batch_data):
             "timestamp": datetime.now().isoformat()
         }
         
-        response = requests.post(
+        # orjson is much faster than requests' stdlib json encoding on numeric-heavy batches
+        response = session.post(
             API_URL,
-            json=payload,
+            data=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+            headers={"Content-Type": "application/json"},
             timeout=10
         )
         
@@ -162,13 +185,36 @@ def send_batch_to_server(batch_data):
         print(f"[API] ✗ Connection error: {e}")
         save_failed_batch(batch_data)
 
+def sender_loop():
+    """Upload batches from send_queue until a None sentinel arrives"""
+    while True:
+        batch_data = send_queue.get()
+        try:
+            if batch_data is None:
+                return
+            send_batch_to_server(batch_data)
+        finally:
+            send_queue.task_done()
+
+def start_sender():
+    """Start the background upload thread"""
+    global sender_thread
+    sender_thread = threading.Thread(target=sender_loop, daemon=True)
+    sender_thread.start()
+
+def stop_sender():
+    """Flush queued batches and stop the upload thread"""
+    if sender_thread is not None and sender_thread.is_alive():
+        send_queue.put(None)
+        sender_thread.join()
+
 def save_failed_batch(batch_data):
     """Save failed batch for retry later"""
     try:
         os.makedirs("failed_batches", exist_ok=True)
         filename = f"batch_{int(time.time())}.json"
-        with open(os.path.join("failed_batches", filename), 'w') as f:
-            json.dump(batch_data, f)
+        with open(os.path.join("failed_batches", filename), 'wb') as f:
+            f.write(orjson.dumps(batch_data, option=orjson.OPT_SERIALIZE_NUMPY))
         print(f"  ↳ Saved for retry: {filename}")
     except:
         pass
@@ -500,14 +546,12 @@ def process_and_send_flows():
         
         # Send batch when size is reached
         if len(batch_data) >= BATCH_SIZE:
-            with batch_lock:
-                send_batch_to_server(batch_data.copy())
-                batch_data.clear()
+            send_queue.put(batch_data.copy())
+            batch_data.clear()
     
     # Send any remaining flows
     if batch_data:
-        with batch_lock:
-            send_batch_to_server(batch_data.copy())
+        send_queue.put(batch_data.copy())
             
     
     print(f"[+] Processed {len(snapshot)} flows (sent to server)")
@@ -516,14 +560,19 @@ def process_and_send_flows():
 
 def periodic_send(interval=10):
     """Periodically send flows to server"""
-    while running:
-        time.sleep(interval)
+    # Waiting on stop_event instead of sleeping lets shutdown interrupt the interval
+    while not stop_event.wait(interval):
         process_and_send_flows()
 
 def signal_handler(sig, frame):
     global running
     running = False
     print("\n[!] Stopping capture...")
+
+    # Stop periodic_send first so nothing is queued after stop_sender's sentinel
+    stop_event.set()
+    if periodic_thread is not None:
+        periodic_thread.join()
     
     # Send any remaining flows in the batch buffer
     with batch_lock:
@@ -537,6 +586,9 @@ def signal_handler(sig, frame):
     
     # Clear flows after sending
     flows.clear()
+
+    # Wait for queued uploads to finish
+    stop_sender()
     
     print("[+] Capture stopped. All flows sent to server.")
     sys.exit(0)
@@ -551,7 +603,7 @@ def main():
     args = ap.parse_args()
     
     # Update configuration from arguments
-    global API_URL, DEVICE_ID
+    global API_URL, DEVICE_ID, periodic_thread
     API_URL = f"{args.server.rstrip('/')}/api/batch-flows"
     if args.device_id:
         DEVICE_ID = args.device_id
@@ -562,7 +614,9 @@ def main():
         print(f"[*] Sending to server: {API_URL}")
         print(f"[*] Device ID: {DEVICE_ID}")
         
-        threading.Thread(target=periodic_send, daemon=True).start()
+        start_sender()
+        periodic_thread = threading.Thread(target=periodic_send, daemon=True)
+        periodic_thread.start()
         sniff(iface=args.iface, prn=handle_packet, store=False)
     else:
         if not args.input:
@@ -572,12 +626,14 @@ def main():
         print(f"[*] Processing PCAP file: {args.input}")
         print(f"[*] Sending to server: {API_URL}")
         
+        start_sender()
         with PcapReader(args.input) as pr:
             for pkt in pr:
                 handle_packet(pkt)
         
         # Process and send all flows
         process_and_send_flows()
+        stop_sender()
         print("[+] PCAP processing complete!")
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -199,7 +199,7 @@ class PythonClient {
     const escapedWorker = this.workerPath.replace(/\\/g, '\\\\');
 
     const code = `
-import sys, json, traceback
+import sys, traceback
 sys.path.append(r'${escapedWorker}')
 
 # Force flush for real-time output
@@ -216,11 +216,11 @@ try:
     print(f"[NODE->PYTHON] Classification returned DataFrame with {len(result_df)} rows", flush=True)
 
     if result_df is not None and not result_df.empty:
-        flows = result_df.to_dict('records')
-        print(f"[NODE->PYTHON] Converted {len(flows)} flows to JSON", flush=True)
+        # Serialize in pandas' C encoder instead of building a dict per row
+        json_output = result_df.to_json(orient='records', double_precision=15)
+        print(f"[NODE->PYTHON] Converted {len(result_df)} flows to JSON", flush=True)
 
         # Print JSON as a SINGLE LINE to make parsing easier
-        json_output = json.dumps(flows)
         print("===JSON_START===" + json_output + "===JSON_END===")
     else:
         flows = []
@@ -1,11 +1,16 @@
 
 # worker/classifier_core.py
 import os
+import csv
+import functools
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import joblib
 import subprocess
 import sys
+import threading
 
 # ---------------- Paths ----------------
 BASE_DIR = os.path.dirname(__file__)
@@ -39,12 +44,83 @@ COLUMN_MAPPING = {
 }
 MODEL_FEATURES = list(COLUMN_MAPPING.values())
 
+# Non-feature columns passed through to the frontend
+PASSTHROUGH_COLUMNS = ['URLs', 'urls', 'SrcIP', 'DstIP', 'SrcPort', 'DstPort', 'Protocol']
+
 # ---------------- Labels ----------------
 LABEL_MAP = {0: "Web", 1: "Multimedia", 2: "Social Media", 3: "Malicious"}
+LABEL_ARR = np.array([LABEL_MAP[i] for i in range(len(LABEL_MAP))], dtype=object)
 
 # ---------------- Load Models ----------------
-SCALER = joblib.load(os.path.join(MODEL_DIR, "scaler_new_xgb.pkl"))
-MODEL = joblib.load(os.path.join(MODEL_DIR, "xgboost_model_new.pkl"))
+MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model_new.pkl")
+SCALER_PATH = os.path.join(MODEL_DIR, "scaler_new_xgb.pkl")
+# Optional TL2cgen-compiled copy of the booster, built by compile_model_library()
+COMPILED_MODEL_PATH = os.path.join(
+    MODEL_DIR, "xgboost_model_new" + (".dll" if sys.platform == "win32" else ".so")
+)
+
+# Loaded on first classification so producer-only imports (e.g. extract_flows_from_pcap) stay light
+_MODELS = None
+_MODELS_LOCK = threading.Lock()
+
+
+def _load_compiled_predictor():
+    """TL2cgen predictor for the compiled model, or None if it is missing, stale or tl2cgen isn't installed"""
+    if not os.path.exists(COMPILED_MODEL_PATH):
+        return None
+    if os.path.getmtime(COMPILED_MODEL_PATH) < os.path.getmtime(MODEL_PATH):
+        print("[CLASSIFIER] Compiled model is older than the XGBoost model, ignoring it", file=sys.stderr)
+        return None
+    try:
+        import tl2cgen
+    except ImportError:
+        return None
+    try:
+        return tl2cgen.Predictor(COMPILED_MODEL_PATH)
+    except Exception as e:
+        # Wrong architecture/toolchain or a corrupt library: fall back to the booster
+        print(f"[CLASSIFIER] Could not load compiled model {COMPILED_MODEL_PATH}: {e}", file=sys.stderr)
+        return None
+
+
+def _get_models():
+    """Load the scaler and model once; returns (scaler mean, scaler scale, booster, compiled predictor or None)"""
+    global _MODELS
+    if _MODELS is None:
+        with _MODELS_LOCK:
+            if _MODELS is None:
+                scaler = joblib.load(SCALER_PATH, mmap_mode="r")
+                model = joblib.load(MODEL_PATH)
+                # StandardScaler parameters, applied with in-place numpy ops instead of scaler.transform;
+                # predictions go through the raw booster to skip the sklearn wrapper's DMatrix build
+                _MODELS = (
+                    np.asarray(scaler.mean_, dtype=np.float64),
+                    np.asarray(scaler.scale_, dtype=np.float64),
+                    model.get_booster(),
+                    _load_compiled_predictor(),
+                )
+    return _MODELS
+
+
+def compile_model_library(toolchain=None):
+    """Compile the XGBoost booster to a native library with Treelite/TL2cgen (run once per model/platform)"""
+    import treelite
+    import tl2cgen
+
+    global _MODELS
+    booster = _get_models()[2]
+    if toolchain is None:
+        toolchain = "msvc" if sys.platform == "win32" else "gcc"
+    tl2cgen.export_lib(
+        treelite.frontend.from_xgboost(booster),
+        toolchain=toolchain,
+        libpath=COMPILED_MODEL_PATH,
+        params={"parallel_comp": os.cpu_count() or 1}
+    )
+    # Pick up the new library on the next classification
+    with _MODELS_LOCK:
+        _MODELS = None
+    return COMPILED_MODEL_PATH
 
 # ---------------- Helper Functions ----------------
 def extract_flows_from_pcap(pcap_path, output_csv="gmflows.csv"):
@@ -61,11 +137,163 @@ def extract_flows_from_pcap(pcap_path, output_csv="gmflows.csv"):
     return output_csv if os.path.exists(output_csv) else None
 
 
+def flows_csv_convert_options(header):
+    """Pyarrow convert options keeping only the feature and pass-through columns"""
+    wanted = set(COLUMN_MAPPING) | set(PASSTHROUGH_COLUMNS)
+    return pacsv.ConvertOptions(
+        include_columns=[c for c in header if c in wanted],
+        # Features go straight to float32, halving the bytes fed to the scaler.
+        # URLs is pinned to string: it is often empty in the first block, which
+        # would otherwise fix its type to null for the rest of a streamed read
+        column_types={**{k: pa.float32() for k in COLUMN_MAPPING}, 'URLs': pa.string(), 'urls': pa.string()}
+    )
+
+
+def _skip_invalid_row(row):
+    """Pyarrow invalid_row_handler: drop a malformed row (e.g. a half-written last line) instead of the whole file"""
+    print(f"[!] Skipping malformed CSV row: expected {row.expected_columns} columns, got {row.actual_columns}", file=sys.stderr)
+    return "skip"
+
+
+def flows_csv_parse_options():
+    """Pyarrow parse options that skip malformed rows rather than failing the whole read"""
+    return pacsv.ParseOptions(invalid_row_handler=_skip_invalid_row)
+
+
+def read_flows_csv(csv_path):
+    """Parse only the model feature and pass-through columns of a flow CSV"""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if not header:
+        return pd.DataFrame()
+
+    table = pacsv.read_csv(
+        csv_path,
+        parse_options=flows_csv_parse_options(),
+        convert_options=flows_csv_convert_options(header)
+    )
+    return table.to_pandas()
+
+
+def build_feature_matrix(df):
+    """Build the raw model input from CSV columns; missing features are 0, NaN/inf are zeroed when standardizing"""
+    # float32 holds the parsed features exactly (they are read as float32)
+    X = np.zeros((len(df), len(MODEL_FEATURES)), dtype=np.float32)
+    # COLUMN_MAPPING is ordered like MODEL_FEATURES, so column i is feature i
+    for i, src in enumerate(COLUMN_MAPPING):
+        if src in df.columns:
+            X[:, i] = df[src].to_numpy(dtype=np.float32)
+    return X
+
+
+# Rows * features from which the Numba kernel's ~0.7s JIT compile pays off; numba
+# is only imported once a batch this large shows up, so imports stay light
+NUMBA_MIN_CELLS = 1_000_000
+_NUMBA_KERNEL = None  # compiled on first use; False once numba proved unusable
+_NUMBA_LOCK = threading.Lock()
+
+
+def _get_numba_kernel():
+    """Compile the fused standardize kernel once; returns None if numba is unavailable"""
+    global _NUMBA_KERNEL
+    if _NUMBA_KERNEL is None:
+        with _NUMBA_LOCK:
+            if _NUMBA_KERNEL is None:
+                try:
+                    from numba import njit, prange
+                except ImportError:  # numba is optional; the numpy path is used instead
+                    _NUMBA_KERNEL = False
+                else:
+                    # No cache=True: numba's on-disk cache records the importing module
+                    # name and breaks when this file is imported under another name
+                    @njit(parallel=True)
+                    def kernel(X, mean, scale):
+                        n, f = X.shape
+                        for i in prange(n):
+                            for j in range(f):
+                                v = np.float64(X[i, j])
+                                if not np.isfinite(v):
+                                    v = 0.0
+                                X[i, j] = (v - mean[j]) / scale[j]
+
+                    _NUMBA_KERNEL = kernel
+    return _NUMBA_KERNEL or None
+
+
+# Scaling arithmetic runs in float64 (mean/scale are float64) and is rounded to
+# float32 once on the way back into X; doing it in float32 flips ~0.7% of
+# predictions on the sample CSVs because scaled values land on split thresholds
+def standardize_features(X, mean, scale):
+    """Zero NaN/inf and standardize X in place, in one Numba pass for large batches"""
+    global _NUMBA_KERNEL
+    kernel = _get_numba_kernel() if X.size >= NUMBA_MIN_CELLS else None
+    if kernel is not None:
+        try:
+            # One call at a time: under numba's workqueue threading layer (no TBB/OpenMP)
+            # concurrent parallel calls, e.g. from two Streamlit sessions, abort the process
+            with _NUMBA_LOCK:
+                kernel(X, mean, scale)
+            return
+        except Exception as e:
+            print(f"[CLASSIFIER] Numba kernel failed, using numpy: {e}", file=sys.stderr)
+            _NUMBA_KERNEL = False
+    np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    np.divide(np.subtract(X, mean), scale, out=X)
+
+
+def predict_classes(X):
+    """Class ids for a raw feature matrix from build_feature_matrix (standardized in place)"""
+    scaler_mean, scaler_scale, booster, compiled = _get_models()
+    standardize_features(X, scaler_mean, scaler_scale)
+    if compiled is not None:
+        import tl2cgen
+        # Output is (rows, targets, classes); one target here
+        return compiled.predict(tl2cgen.DMatrix(X)).reshape(len(X), -1).argmax(axis=1)
+    return booster.inplace_predict(X).argmax(axis=1)
+
+
+def classify_frame(df, last_n_seconds=None):
+    """Predict a class for every flow in a parsed flow DataFrame"""
+    # FIX: Only filter if last_n_seconds is provided and valid
+    if last_n_seconds is not None and last_n_seconds > 0 and "FlowDuration" in df.columns:
+        max_dur = df["FlowDuration"].max()
+        threshold = max_dur - last_n_seconds
+        original_count = len(df)
+        df = df[df["FlowDuration"] >= threshold]
+        print(f"[CLASSIFIER] Filtered to last {last_n_seconds}s: {len(df)} rows (from {original_count})", flush=True)
+    else:
+        print(f"[CLASSIFIER] Using all {len(df)} flows (no time filter)", flush=True)
+
+    y_pred = predict_classes(build_feature_matrix(df))
+
+    # Output is built fresh from the pass-through columns; the feature frame is never mutated
+    # Categorical: 1 byte per row instead of an object pointer per label
+    out = {"Prediction": pd.Categorical.from_codes(y_pred.astype(np.int8, copy=False), categories=LABEL_ARR.tolist())}
+    if 'URLs' in df.columns:
+        out["URLs"] = df['URLs'].fillna('').to_numpy()
+    elif 'urls' in df.columns:
+        out["URLs"] = df['urls'].fillna('').to_numpy()
+    for col in ['SrcIP', 'DstIP', 'SrcPort', 'DstPort', 'Protocol']:
+        if col in df.columns:
+            out[col] = df[col].to_numpy()
+    df = pd.DataFrame(out, index=df.index)
+
+    print(f"[CLASSIFIER] Classification complete. Predictions: {df['Prediction'].value_counts().to_dict()}", flush=True)
+    return df
+
+
+@functools.lru_cache(maxsize=8)
+def _classify_csv_cached(csv_path, mtime_ns, size, last_n_seconds):
+    """Parse and classify a CSV; mtime_ns/size only key the cache so edited files are re-read"""
+    df = read_flows_csv(csv_path)
+    if df.empty:
+        print("[!] CSV is empty", file=sys.stderr)
+        return df
+    return classify_frame(df, last_n_seconds)
+
+
 def classify_flows(csv_path, last_n_seconds=None):
     import traceback
-    import pandas as pd
-    import numpy as np
-    import os
 
     df = pd.DataFrame()
     try:
@@ -73,64 +301,14 @@ def classify_flows(csv_path, last_n_seconds=None):
             print(f"[!] CSV not found: {csv_path}", file=sys.stderr)
             return df
 
-        df_read = pd.read_csv(csv_path)
-        if df_read.empty:
-            print("[!] CSV is empty", file=sys.stderr)
-            return df
+        st = os.stat(csv_path)
+        hits = _classify_csv_cached.cache_info().hits
+        df = _classify_csv_cached(csv_path, st.st_mtime_ns, st.st_size, last_n_seconds)
+        if _classify_csv_cached.cache_info().hits > hits:
+            print(f"[CLASSIFIER] CSV unchanged, reusing {len(df)} cached predictions", flush=True)
 
-        df = df_read.copy()
-
-        # FIX: Only filter if last_n_seconds is provided and valid
-        if last_n_seconds is not None and last_n_seconds > 0 and "FlowDuration" in df.columns:
-            max_dur = df["FlowDuration"].max()
-            threshold = max_dur - last_n_seconds
-            original_count = len(df)
-            df = df[df["FlowDuration"] >= threshold]
-            print(f"[CLASSIFIER] Filtered to last {last_n_seconds}s: {len(df)} rows (from {original_count})", flush=True)
-        else:
-            print(f"[CLASSIFIER] Using all {len(df)} flows (no time filter)", flush=True)
-
-        # PRESERVE URL DATA BEFORE RENAMING - FIX NaN ISSUE
-        url_column = None
-        if 'URLs' in df.columns:
-            # Convert NaN to empty strings
-            url_column = df['URLs'].fillna('')
-        elif 'urls' in df.columns:
-            url_column = df['urls'].fillna('')
-
-        # Also preserve original IP/port data for frontend
-        original_columns = {}
-        frontend_columns = ['SrcIP', 'DstIP', 'SrcPort', 'DstPort', 'Protocol']
-        for col in frontend_columns:
-            if col in df.columns:
-                original_columns[col] = df[col]
-
-        # Rename columns safely for model
-        df = df.rename(columns={k: v for k, v in COLUMN_MAPPING.items() if k in df.columns})
-
-        # Ensure all model features exist
-        for col in MODEL_FEATURES:
-            if col not in df.columns:
-                df[col] = 0
-
-        df = df[MODEL_FEATURES]
-        df.replace([np.inf, -np.inf], np.nan, inplace=True)
-        df.fillna(0, inplace=True)
-
-        # Prediction
-        X_scaled = SCALER.transform(df)
-        y_pred = MODEL.predict(X_scaled)
-        df["Prediction"] = [LABEL_MAP.get(p, p) for p in y_pred]
-
-        # ADD BACK URL DATA AND ORIGINAL COLUMNS TO FINAL RESULT
-        if url_column is not None:
-            df["URLs"] = url_column
-            
-        # Add back original columns for frontend
-        for col, data in original_columns.items():
-            df[col] = data
-
-        print(f"[CLASSIFIER] Classification complete. Predictions: {df['Prediction'].value_counts().to_dict()}", flush=True)
+        # Callers get their own copy so the cached frame can't be mutated
+        df = df.copy()
 
     except Exception as e:
         print("[!] Exception in classify_flows:", e, file=sys.stderr)
@@ -138,3 +316,139 @@ def classify_flows(csv_path, last_n_seconds=None):
 
     return df
 
+
+def classify_flows_incremental(csv_path, offset=0):
+    """Classify only the rows appended to csv_path since byte offset.
+
+    Returns (DataFrame, new_offset); pass new_offset back in on the next call.
+    A partially written last line is left for the next call. A file that was
+    truncated or replaced (shrank below offset, or offset no longer falls on a
+    line boundary) is re-read from the top; malformed rows are skipped.
+    """
+    import traceback
+
+    df = pd.DataFrame()
+    try:
+        if not os.path.exists(csv_path):
+            print(f"[!] CSV not found: {csv_path}", file=sys.stderr)
+            return df, offset
+
+        with open(csv_path, "rb") as f:
+            header_line = f.readline()
+            data_start = f.tell()
+            if offset < data_start or offset > os.fstat(f.fileno()).st_size:
+                offset = data_start
+            elif offset > data_start:
+                # A swapped-in snapshot is usually larger, so a stale offset lands mid-line
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    print(f"[CLASSIFIER] {csv_path} was replaced, re-reading from the top", flush=True)
+                    offset = data_start
+            f.seek(offset)
+            data = f.read()
+
+        # Only consume complete lines
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return df, offset
+
+        header = next(csv.reader([header_line.decode("utf-8")]), [])
+        table = pacsv.read_csv(
+            pa.BufferReader(data[:end]),
+            read_options=pacsv.ReadOptions(column_names=header),
+            parse_options=flows_csv_parse_options(),
+            convert_options=flows_csv_convert_options(header)
+        )
+        offset += end
+        if table.num_rows:
+            df = classify_frame(table.to_pandas())
+
+    except Exception as e:
+        print("[!] Exception in classify_flows_incremental:", e, file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+
+    return df, offset
+
+
+def classify_flows_iter(csv_path, batch_size=10_000):
+    """Stream a flow CSV, yielding Arrow RecordBatches of batch_size rows (the last may be shorter).
+
+    Each batch holds the parsed feature/pass-through columns plus a
+    dictionary-encoded Prediction column, so memory stays bounded by the batch
+    rather than the whole file.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if not header:
+        return
+
+    labels = pa.array(LABEL_ARR.tolist(), type=pa.string())
+    reader = pacsv.open_csv(
+        csv_path,
+        parse_options=flows_csv_parse_options(),
+        convert_options=flows_csv_convert_options(header)
+    )
+
+    def classify_batch(table):
+        batch = table.combine_chunks().to_batches()[0]
+        y_pred = predict_classes(build_feature_matrix(batch.to_pandas()))
+        prediction = pa.DictionaryArray.from_arrays(pa.array(y_pred.astype(np.int8)), labels)
+        return pa.RecordBatch.from_arrays(
+            batch.columns + [prediction],
+            names=batch.schema.names + ["Prediction"]
+        )
+
+    # The reader yields ~1 MB blocks (a few hundred flow rows), so blocks are
+    # gathered up to batch_size before each predict call
+    pending, pending_rows = [], 0
+    for record_batch in reader:
+        pending.append(record_batch)
+        pending_rows += record_batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield classify_batch(table.slice(0, batch_size))
+            rest = table.slice(batch_size)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        yield classify_batch(pa.Table.from_batches(pending))
+
+
+def classify_flows_to_parquet(csv_path, parquet_path, batch_size=10_000):
+    """Classify a flow CSV batch by batch into a zstd-compressed Parquet file"""
+    import traceback
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for batch in classify_flows_iter(csv_path, batch_size):
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, batch.schema, compression="zstd", compression_level=3)
+            writer.write_batch(batch)
+    except Exception as e:
+        print("[!] Exception in classify_flows_to_parquet:", e, file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return parquet_path if writer is not None else None
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Flow classifier utilities")
+    ap.add_argument("--compile-model", action="store_true",
+                    help=f"Compile the XGBoost model to {os.path.basename(COMPILED_MODEL_PATH)} (needs treelite and tl2cgen)")
+    ap.add_argument("--toolchain", default=None, help="C compiler for --compile-model (default: msvc on Windows, gcc elsewhere)")
+    args = ap.parse_args()
+
+    if args.compile_model:
+        print(f"[+] Compiled model written to {compile_model_library(args.toolchain)}")
+    else:
+        ap.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -788,6 +788,17 @@ def handle_packet(pkt):
 #                     # Also map IP to hostname for correlation
 #                     ip_to_hostname[ip.dst] = domain
 
+def replace_file(src, dst, retries=5):
+    """os.replace, retried briefly: Windows refuses while a reader has dst open"""
+    for attempt in range(retries):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.1)
+
 def dump_flows_to_csv(filename):
     headers=[
         "FlowID","SrcIP","DstIP","SrcPort","DstPort","Protocol",
@@ -814,7 +825,10 @@ def dump_flows_to_csv(filename):
         "URLs"  # <--- full URLs instead of just hosts
     ]
     snapshot = list(flows.items())
-    with open(filename,"w",newline="",encoding="utf-8") as fcsv:
+    # Write to a temp file and swap it in, so a reader classifying the CSV
+    # never sees a truncated or half-written file
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename,"w",newline="",encoding="utf-8") as fcsv:
         w=csv.DictWriter(fcsv,fieldnames=headers); w.writeheader()
         for idx,(key,fl) in enumerate(snapshot,start=1):
             dur=max(0.0,fl["end"]-fl["start"])
@@ -898,6 +912,14 @@ def dump_flows_to_csv(filename):
                 "URLs":",".join(fl.get("urls",[]))
             }
             w.writerow(row)
+    try:
+        replace_file(tmp_filename, filename)
+    except OSError as e:
+        # Keep the dump thread alive; the next interval writes a fresh snapshot
+        print(f"[!] Could not update {filename}: {e}")
+        try: os.remove(tmp_filename)
+        except OSError: pass
+        return
     print(f"[+] Updated {filename} with {len(flows)} flows")
 
 def periodic_dump(filename,interval=30):